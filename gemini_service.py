@@ -14,6 +14,14 @@ from selenium.common.exceptions import NoSuchElementException
 
 logger = logging.getLogger(__name__)
 
+# Response cleanup patterns
+BULLET_RUN_PATTERN = re.compile(r'[•\-\*]{2,}')
+LEADING_NUMBER_PATTERN = re.compile(r'^\d+\.?\s*')
+
+# Logged-in indicators
+LOGGED_IN_INDICATORS = ("gemini", "conversation", "profile")
+LOGGED_IN_PATTERN = re.compile('|'.join(map(re.escape, LOGGED_IN_INDICATORS)), re.IGNORECASE)
+
 
 class GeminiService:
     """Service class for Google Gemini integration in Twitter agent"""
@@ -82,15 +90,13 @@ class GeminiService:
         try:
             logger.info("Checking Gemini login status...")
             
-            page_text = self.driver.find_element(By.TAG_NAME, "body").text.lower()
+            page_text = self.driver.find_element(By.TAG_NAME, "body").text
             
             # Check for logged-in indicators
-            logged_in_indicators = ["gemini", "conversation", "profile"]
-            
-            for indicator in logged_in_indicators:
-                if indicator in page_text:
-                    logger.info(f"Found logged-in indicator: '{indicator}'")
-                    return True
+            match = LOGGED_IN_PATTERN.search(page_text)
+            if match:
+                logger.info(f"Found logged-in indicator: '{match.group(0).lower()}'")
+                return True
             
             # Check for input field presence
             try:
@@ -283,9 +289,9 @@ class GeminiService:
                 logger.info(f"📊 Chat usage: {self.current_chat_response_count}/{self.responses_per_chat}")
                 
                 # Clean up response
-                response_text = re.sub(r'[•\-\*]{2,}', '', response_text)
-                response_text = re.sub(r'\s+', ' ', response_text)
-                response_text = re.sub(r'^\d+\.?\s*', '', response_text)
+                response_text = BULLET_RUN_PATTERN.sub('', response_text)
+                response_text = ' '.join(response_text.split())
+                response_text = LEADING_NUMBER_PATTERN.sub('', response_text)
                 response_text = response_text.strip()
                 
                 return response_text
@@ -14,13 +14,19 @@ from selenium.common.exceptions import NoSuchElementException
 
 logger = logging.getLogger(__name__)
 
+# Response cleanup patterns
+BULLET_RUN_PATTERN = re.compile(r'[•\-\*]{2,}')
+LEADING_NUMBER_PATTERN = re.compile(r'^\d+\.?\s*')
+
 
 class PerplexityService:
     """Service class for Perplexity.ai integration in Twitter agent"""
     
     def __init__(self, driver, wait_time: int = 60, debug_mode: bool = False, responses_per_chat: int = 2):
         self.driver = driver
-        self.wait_time = wait_time
+        self.wait_time = wait_time  # Upper bound; query() returns as soon as the answer settles
+        self.response_poll_interval = 2  # Seconds between checks for a settled answer
+        self.stable_polls_required = 2  # Unchanged polls in a row before the answer counts as done
         self.debug_mode = debug_mode
         self.responses_per_chat = responses_per_chat
         
@@ -894,7 +900,7 @@ class PerplexityService:
             
             # Wait for response
             query_submit_time = time.time()
-            logger.info(f"Waiting {self.wait_time} seconds for Perplexity response...")
+            logger.info(f"Waiting up to {self.wait_time} seconds for Perplexity response...")
             
             # Track initial prose count
             initial_prose_count = 0
@@ -905,20 +911,34 @@ class PerplexityService:
             except:
                 pass
             
-            time.sleep(self.wait_time)
-            
-            # Check for new response
-            try:
-                final_prose_elements = self.driver.find_elements(By.CSS_SELECTOR, "div.prose")
-                final_prose_count = len(final_prose_elements)
-                logger.info(f"📊 Final prose count: {final_prose_count}")
+            # Poll until the new answer has stopped streaming instead of always sleeping
+            # the full wait_time; the text is stable once it is unchanged across polls
+            final_prose_count = initial_prose_count
+            last_text = None
+            stable_polls = 0
+            while time.time() - query_submit_time < self.wait_time:
+                time.sleep(self.response_poll_interval)
+                try:
+                    final_prose_count, latest_text = self.driver.execute_script("""
+                        const prose = document.querySelectorAll('div.prose');
+                        return [prose.length, prose.length ? prose[prose.length - 1].innerText : ''];
+                    """)
+                except:
+                    continue
                 
-                if final_prose_count > initial_prose_count:
-                    logger.info(f"✅ New response detected!")
+                if final_prose_count > initial_prose_count and len(latest_text.strip()) > 20 and latest_text == last_text:
+                    stable_polls += 1
+                    if stable_polls >= self.stable_polls_required:
+                        break
                 else:
-                    logger.warning(f"⚠️ No new prose elements detected")
-            except:
-                pass
+                    stable_polls = 0
+                last_text = latest_text
+            
+            logger.info(f"📊 Final prose count: {final_prose_count} (waited {time.time() - query_submit_time:.1f}s)")
+            if final_prose_count > initial_prose_count:
+                logger.info(f"✅ New response detected!")
+            else:
+                logger.warning(f"⚠️ No new prose elements detected")
             
             # Ultra-aggressive scrolling
             logger.info("🔄 Scrolling to bottom...")
@@ -971,9 +991,9 @@ class PerplexityService:
                             logger.info(f"✅ Found response ({len(text)} chars): {text[:100]}...")
                             
                             # Clean up response
-                            text = re.sub(r'[•\-\*]{2,}', '', text)
-                            text = re.sub(r'\s+', ' ', text)
-                            text = re.sub(r'^\d+\.?\s*', '', text)
+                            text = BULLET_RUN_PATTERN.sub('', text)
+                            text = ' '.join(text.split())
+                            text = LEADING_NUMBER_PATTERN.sub('', text)
                             text = text.strip()
                             
                             return text
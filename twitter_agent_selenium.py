@@ -5,12 +5,17 @@ Twitter Agent using Selenium for reliable browser automation
 
 import asyncio
 import os
+import platform
+import subprocess
 import time
 import re
 import json
 import hashlib
+import itertools
+import textwrap
+from collections import deque
 from pathlib import Path
-from typing import List, Dict, Optional, Set
+from typing import List, Dict, Optional
 from dotenv import load_dotenv
 import logging
 from selenium import webdriver
@@ -28,15 +33,118 @@ from perplexity_service import PerplexityService
 from chatgpt_service import ChatGPTService
 from gemini_service import GeminiService
 
-# Load environment variables
-load_dotenv()
-
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# X.com URLs used across navigation paths
+TWITTER_BASE_URL = "https://x.com"
+TWITTER_HOME_URL = TWITTER_BASE_URL + "/home"
+
+# Domains that identify an AI service tab among the open window handles
+AI_SERVICE_DOMAINS = ('perplexity.ai', 'chatgpt.com', 'chat.openai.com', 'gemini.google.com')
+
+# CSS selectors tried in order for each x.com element (the UI changes often)
+TWEET_TEXT_SELECTORS = (
+    '[data-testid="tweetText"]',
+    '[data-testid="tweet-text"]',
+    '.tweet-text',
+    '[role="group"] div[lang]',
+    'div[data-testid="tweet"] div[lang]',
+    'article div[lang]',
+)
+
+REPLY_BUTTON_SELECTORS = (
+    '[data-testid="reply"]',
+    '[aria-label*="Reply"]',
+    '[aria-label*="reply"]',
+    'button[data-testid="reply"]',
+    '[role="button"][aria-label*="Reply"]',
+    '[role="button"][aria-label*="reply"]',
+    'button[aria-label*="Reply"]',
+    'button[aria-label*="reply"]',
+)
+
+COMPOSE_SELECTORS = (
+    '[data-testid="tweetTextarea_0"]',
+    '[data-testid="tweetTextarea"]',
+    'div[contenteditable="true"]',
+    'textarea[placeholder*="reply"]',
+    'textarea[placeholder*="Reply"]',
+)
+
+POST_BUTTON_SELECTORS = (
+    '[data-testid="tweetButton"]',
+    '[data-testid="tweetButtonInline"]',
+    'button[data-testid="tweetButton"]',
+    'button[data-testid="tweetButtonInline"]',
+    '[role="button"][data-testid="tweetButton"]',
+)
+
+# Common error patterns from AI assistants, matched in one pass over the response
+ERROR_RESPONSE_PATTERNS = (
+    "something went wrong",
+    "an error occurred",
+    "error occurred",
+    "try again",
+    "please try again",
+    "sorry, i couldn't",
+    "sorry, i can't",
+    "i apologize",
+    "i'm sorry",
+    "unable to process",
+    "unable to complete",
+    "request failed",
+    "connection error",
+    "timeout error",
+    "network error",
+    "service unavailable",
+    "temporarily unavailable",
+    "please refresh",
+    "please reload",
+    "internal error",
+    "system error",
+    "technical difficulty",
+    "experiencing issues",
+    "something's not right",
+    "oops",
+    "whoops",
+    "failed to load",
+    "failed to generate",
+    "could not generate",
+    "unable to generate",
+    "error generating",
+    "error processing",
+    "rate limit",
+    "quota exceeded",
+    "too many requests",
+)
+ERROR_RESPONSE_PATTERN = re.compile('|'.join(map(re.escape, ERROR_RESPONSE_PATTERNS)))
+
+# A whole link in an AI response (https://www.example.com counts once)
+LINK_PATTERN = re.compile(r'\b(?:https?://|www\.)[^\s.]\S*')
+
+# Toast/page phrases x.com shows once a reply has been posted
+REPLY_SUCCESS_INDICATORS = ("your reply was sent", "reply sent", "posted")
+REPLY_SUCCESS_PATTERN = re.compile('|'.join(map(re.escape, REPLY_SUCCESS_INDICATORS)), re.IGNORECASE)
+
+# Non-prose tokens (links and @mentions) stripped from a tweet in a single pass
+# before judging whether it is worth a reply
+NON_PROSE_PATTERN = re.compile(r'\b(?:https?://|www\.)[^\s.]\S*|(?<![\w.])@\w+')
+
+_env_loaded = False
+
+def _load_env_once():
+    """Load .env into the environment the first time an agent is configured"""
+    global _env_loaded
+    if not _env_loaded:
+        load_dotenv()
+        _env_loaded = True
+
 class SeleniumTwitterAgent:
     def __init__(self):
+        _load_env_once()
+
         self.base_prompt = """
         You are a funny commentator talking in the style of a casually speaking comedian.
         # Rules for your response
@@ -79,10 +187,17 @@ class SeleniumTwitterAgent:
         7) Do NOT apologize and DO NOT refuse to answer AND DO NOT ask further questions
         8) Do NOT ADD ANY LINKS to external sources;  Do NOT ADD ANY LINKS to external sources;  Do NOT ADD ANY LINKS to external sources!!!!!!
         """
+        # Drop the source-code indentation once; otherwise ~8 spaces per line are
+        # typed into the AI chat box for every single tweet
+        self.base_prompt = textwrap.dedent(self.base_prompt).strip()
+        # Pre-split the template around its single placeholder so each tweet
+        # only needs a concatenation instead of a full str.format() parse
+        self._prompt_prefix, self._prompt_suffix = self.base_prompt.split('{tweet_content}')
         # Configuration from environment
         self.ai_service = os.getenv('AI_SERVICE', 'perplexity').lower()
         self.delay_between_tweets = int(os.getenv('DELAY_BETWEEN_TWEETS', 5))
         self.max_tweets_per_session = int(os.getenv('MAX_TWEETS_PER_SESSION', 5))
+        self.max_replies_per_hour = int(os.getenv('MAX_REPLIES_PER_HOUR', 0))  # 0 = unlimited
         self.ai_wait_time = int(os.getenv('AI_WAIT_TIME', 60))
         self.ai_responses_per_chat = max(1, int(os.getenv('AI_RESPONSES_PER_CHAT', 2)))
         self.headless = os.getenv('HEADLESS', 'false').lower() == 'true'
@@ -91,9 +206,15 @@ class SeleniumTwitterAgent:
         
         # Validation and retry configuration
         self.min_response_length = int(os.getenv('MIN_RESPONSE_LENGTH', 20))
+        self.max_response_length = int(os.getenv('MAX_RESPONSE_LENGTH', 0))  # 0 = no limit
+        if 0 < self.max_response_length < 4:
+            # Truncation keeps room for "..." so anything shorter can't be honoured
+            logger.warning(f"⚠️ MAX_RESPONSE_LENGTH={self.max_response_length} is too small (min 4), disabling truncation")
+            self.max_response_length = 0
         self.min_tweet_length = int(os.getenv('MIN_TWEET_LENGTH', 30))
         self.min_unique_word_ratio = float(os.getenv('MIN_UNIQUE_WORD_RATIO', 0.3))
         self.min_words_for_repetition_check = int(os.getenv('MIN_WORDS_FOR_REPETITION_CHECK', 3))
+        self.max_response_links = int(os.getenv('MAX_RESPONSE_LINKS', 0))
         self.max_ai_retries = int(os.getenv('MAX_AI_RETRIES', 3))
         self.max_extraction_attempts = int(os.getenv('MAX_EXTRACTION_ATTEMPTS', 5))
         self.no_tweets_threshold = int(os.getenv('NO_TWEETS_THRESHOLD', 3))
@@ -101,9 +222,12 @@ class SeleniumTwitterAgent:
         self.save_frequency = int(os.getenv('SAVE_FREQUENCY', 5))
         self.button_wait_timeout = int(os.getenv('BUTTON_WAIT_TIMEOUT', 10))
         self.retry_wait_time = int(os.getenv('RETRY_WAIT_TIME', 2))
+        self.ai_failure_threshold = int(os.getenv('AI_FAILURE_THRESHOLD', 3))
+        self.ai_cooldown_seconds = int(os.getenv('AI_COOLDOWN_SECONDS', 300))
         
         # File and directory configuration
         self.processed_tweets_filename = os.getenv('PROCESSED_TWEETS_FILE', 'processed_tweets.json')
+        self.processed_retention_days = int(os.getenv('PROCESSED_TWEETS_RETENTION_DAYS', 30))  # 0 = keep forever
         self.chrome_profile_dir = os.getenv('CHROME_PROFILE_DIR', '.chrome_automation_profile_twitter')
 
         # Configure debug logging
@@ -118,6 +242,7 @@ class SeleniumTwitterAgent:
         logger.info(f"   🤖 AI Service: {self.ai_service.upper()}")
         logger.info(f"   📱 Tweet delay: {self.delay_between_tweets}s")
         logger.info(f"   🎯 Max tweets per session: {self.max_tweets_per_session}")
+        logger.info(f"   🚦 Max replies per hour: {self.max_replies_per_hour or 'unlimited'}")
         logger.info(f"   ⏱️ AI wait time: {self.ai_wait_time}s")
         logger.info(f"   💬 Responses per chat: {self.ai_responses_per_chat}")
         logger.info(f"   👻 Headless mode: {self.headless}")
@@ -126,11 +251,15 @@ class SeleniumTwitterAgent:
         if self.debug_mode:
             logger.debug(f"⚙️ Advanced Configuration:")
             logger.debug(f"   📏 Min response length: {self.min_response_length} chars")
+            logger.debug(f"   📏 Max response length: {self.max_response_length or 'unlimited'} chars")
             logger.debug(f"   📏 Min tweet length: {self.min_tweet_length} chars")
+            logger.debug(f"   🔗 Max links in response: {self.max_response_links}")
             logger.debug(f"   🔄 Max AI retries: {self.max_ai_retries}")
             logger.debug(f"   🔄 Max extraction attempts: {self.max_extraction_attempts}")
+            logger.debug(f"   🔌 AI circuit breaker: {self.ai_failure_threshold} failed tweets -> {self.ai_cooldown_seconds}s cooldown")
             logger.debug(f"   💾 Save frequency: every {self.save_frequency} tweets")
             logger.debug(f"   📁 Processed tweets file: {self.processed_tweets_filename}")
+            logger.debug(f"   🗓️ Processed tweets retention: {self.processed_retention_days or 'forever'} days")
             logger.debug(f"   📁 Chrome profile dir: {self.chrome_profile_dir}")
 
         self.driver = None
@@ -139,35 +268,129 @@ class SeleniumTwitterAgent:
         # Persistent tweet tracking
         self.processed_tweets_file = Path(self.processed_tweets_filename)
         self.processed_tweets = self._load_processed_tweets()
+        self._processed_tweets_dirty = False  # Set when the in-memory hashes diverge from the file
+        self._prune_processed_tweets()
         self.current_username = None  # Will be detected after login
 
-    def _load_processed_tweets(self) -> Set[str]:
-        """Load processed tweet hashes from file"""
+        # Monotonic timestamps of recent replies for the sliding-window reply limit
+        self.reply_timestamps = deque()
+
+        # Run-local ids for tweets whose status link could not be found
+        self._fallback_tweet_ids = itertools.count()
+
+    def _load_processed_tweets(self) -> Dict[str, float]:
+        """Load processed tweet hashes (hash -> time first seen) from file"""
         try:
             if self.processed_tweets_file.exists():
-                with open(self.processed_tweets_file, 'r') as f:
+                with open(self.processed_tweets_file, 'rb') as f:
                     data = json.load(f)
-                    processed_set = set(data.get('processed_tweets', []))
-                    logger.info(f"Loaded {len(processed_set)} previously processed tweets")
-                    return processed_set
+                    processed = data.get('processed_tweets', {})
+                    now = time.time()
+                    if isinstance(processed, list):
+                        # Older files stored a bare list; start their retention clock now
+                        processed = dict.fromkeys(processed, now)
+                    elif isinstance(processed, dict):
+                        # Hand-edited or half-migrated entries may lack a usable timestamp
+                        processed = {
+                            tweet_hash: seen_at if isinstance(seen_at, (int, float)) and not isinstance(seen_at, bool) else now
+                            for tweet_hash, seen_at in processed.items()
+                        }
+                    else:
+                        processed = {}
+                    logger.info(f"Loaded {len(processed)} previously processed tweets")
+                    return processed
         except Exception as e:
             logger.warning(f"Could not load processed tweets file: {e}")
-        return set()
+        return {}
+
+    def _prune_processed_tweets(self):
+        """Forget processed tweet hashes older than the retention window"""
+        if self.processed_retention_days <= 0:
+            return
+        cutoff = time.time() - self.processed_retention_days * 86400
+        expired = [tweet_hash for tweet_hash, seen_at in self.processed_tweets.items() if seen_at < cutoff]
+        for tweet_hash in expired:
+            del self.processed_tweets[tweet_hash]
+        if expired:
+            self._processed_tweets_dirty = True
+            logger.info(f"🧹 Dropped {len(expired)} processed tweets older than {self.processed_retention_days} days")
 
     def _save_processed_tweets(self):
         """Save processed tweet hashes to file"""
+        self._prune_processed_tweets()
+        if not self._processed_tweets_dirty:
+            logger.debug("Processed tweets unchanged since last save, skipping write")
+            return
         try:
             data = {
-                'processed_tweets': list(self.processed_tweets),
+                'processed_tweets': self.processed_tweets,
                 'last_updated': time.time()
             }
-            with open(self.processed_tweets_file, 'w') as f:
-                json.dump(data, f, indent=2)
+            # Serialise once, write in a single call, then atomically swap the file in
+            # so a crash mid-save can never leave a truncated history behind
+            payload = json.dumps(data, separators=(',', ':'))
+            tmp_file = self.processed_tweets_file.with_name(self.processed_tweets_file.name + '.tmp')
+            with open(tmp_file, 'w') as f:
+                f.write(payload)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_file, self.processed_tweets_file)
+            self._processed_tweets_dirty = False
             logger.debug(f"Saved {len(self.processed_tweets)} processed tweets to file")
         except Exception as e:
             logger.warning(f"Could not save processed tweets file: {e}")
 
-    def _get_tweet_hash(self, tweet_content: str) -> str:
+    def _format_prompt(self, tweet_content: str) -> str:
+        """Fill the base prompt template with the tweet content"""
+        return self._prompt_prefix + tweet_content + self._prompt_suffix
+
+    def _is_mostly_links_or_mentions(self, tweet_text: str) -> bool:
+        """Check if a tweet has too little prose left once links and @mentions are removed"""
+        prose, removed = NON_PROSE_PATTERN.subn(' ', tweet_text)
+        if not removed:
+            return False
+        # Measure the remaining prose the same way the extraction length filter does
+        return len(' '.join(prose.split())) < self.min_tweet_length
+
+    def _truncate_response(self, response_text: str) -> str:
+        """Cut an over-long response at a word boundary so it fits in a reply"""
+        limit = self.max_response_length
+        if not limit or len(response_text) <= limit:
+            return response_text
+        cut = response_text.rfind(' ', 0, limit - 3)
+        if cut < limit // 2:
+            cut = limit - 3
+        logger.info(f"✂️ Response is {len(response_text)} chars, trimming to {limit}")
+        return response_text[:cut].rstrip() + "..."
+
+    def _wait_for_reply_slot(self):
+        """Block until another reply is allowed by the reply delay and hourly limit"""
+        window = 3600
+        now = time.monotonic()
+        while self.reply_timestamps and now - self.reply_timestamps[0] >= window:
+            self.reply_timestamps.popleft()
+
+        # Space replies DELAY_BETWEEN_TWEETS apart, counting the time already spent
+        # extracting and refreshing since the last reply instead of sleeping on top of it
+        if self.reply_timestamps and self.delay_between_tweets > 0:
+            remaining = self.delay_between_tweets - (now - self.reply_timestamps[-1])
+            if remaining > 0:
+                logger.info(f"Waiting {remaining:.0f} seconds before next reply...")
+                time.sleep(remaining)
+                now = time.monotonic()
+
+        if self.max_replies_per_hour <= 0:
+            return
+
+        if len(self.reply_timestamps) >= self.max_replies_per_hour:
+            wait_time = window - (now - self.reply_timestamps[0])
+            if wait_time > 0:  # The delay above may already have freed the slot
+                logger.info(f"🚦 Reply limit reached ({self.max_replies_per_hour}/hour) - waiting {wait_time:.0f}s for a free slot...")
+                time.sleep(wait_time)
+            self.reply_timestamps.popleft()
+
+    @staticmethod
+    def _get_tweet_hash(tweet_content: str) -> str:
         """Generate a hash for tweet content to use as unique identifier"""
         return hashlib.md5(tweet_content.encode('utf-8')).hexdigest()
     
@@ -179,68 +402,37 @@ class SeleniumTwitterAgent:
         
         response_lower = response_text.lower().strip()
         
-        # Common error patterns from AI assistants
-        error_patterns = [
-            "something went wrong",
-            "an error occurred",
-            "error occurred",
-            "try again",
-            "please try again",
-            "sorry, i couldn't",
-            "sorry, i can't",
-            "i apologize",
-            "i'm sorry",
-            "unable to process",
-            "unable to complete",
-            "request failed",
-            "connection error",
-            "timeout error",
-            "network error",
-            "service unavailable",
-            "temporarily unavailable",
-            "please refresh",
-            "please reload",
-            "internal error",
-            "system error",
-            "technical difficulty",
-            "experiencing issues",
-            "something's not right",
-            "oops",
-            "whoops",
-            "failed to load",
-            "failed to generate",
-            "could not generate",
-            "unable to generate",
-            "error generating",
-            "error processing",
-            "rate limit",
-            "quota exceeded",
-            "too many requests"
-        ]
-        
-        # Check for error patterns
-        for pattern in error_patterns:
-            if pattern in response_lower:
-                logger.warning(f"⚠️ Detected error pattern: '{pattern}' in response")
-                return True
+        # Check for error patterns (single scan over the compiled alternation)
+        match = ERROR_RESPONSE_PATTERN.search(response_lower)
+        if match:
+            logger.warning(f"⚠️ Detected error pattern: '{match.group(0)}' in response")
+            return True
         
         # Check if response is just error codes or numbers
         if response_text.strip().isdigit():
             logger.warning("⚠️ Response appears to be just numbers")
             return True
-        
+
+        # Reject responses that still carry links/citations - the prompt forbids them and
+        # catching it here is far cheaper than opening the reply box and typing it out
+        link_count = len(LINK_PATTERN.findall(response_lower))
+        if link_count > self.max_response_links:
+            logger.warning(f"⚠️ Response contains {link_count} link(s) (max: {self.max_response_links})")
+            return True
+
         # Check if response is suspiciously repetitive (same word repeated)
         words = response_text.split()
-        if len(words) > self.min_words_for_repetition_check and len(set(words)) < len(words) * self.min_unique_word_ratio:
-            logger.warning(f"⚠️ Response appears to be repetitive (unique words ratio: {len(set(words))/len(words):.2f}, threshold: {self.min_unique_word_ratio})")
-            return True
+        if len(words) > self.min_words_for_repetition_check:
+            unique_ratio = len(set(words)) / len(words)
+            if unique_ratio < self.min_unique_word_ratio:
+                logger.warning(f"⚠️ Response appears to be repetitive (unique words ratio: {unique_ratio:.2f}, threshold: {self.min_unique_word_ratio})")
+                return True
         
         logger.debug(f"✅ Response validation passed")
         return False
 
     def _kill_existing_chrome_profile_processes(self, profile_dir: str):
         """Kill any Chrome processes using our automation profile to avoid conflicts"""
-        import subprocess
         try:
             # Find Chrome processes using our profile
             result = subprocess.run(
@@ -316,7 +508,7 @@ class SeleniumTwitterAgent:
             preferences_path = profile_path / "Preferences"
             if preferences_path.exists():
                 try:
-                    with open(preferences_path, 'r') as f:
+                    with open(preferences_path, 'rb') as f:
                         prefs = json.load(f)
                     
                     # Check if exit_type is "Crashed"
@@ -369,9 +561,6 @@ class SeleniumTwitterAgent:
             
             # Use undetected_chromedriver with specific settings for ARM Macs
             # Get Chrome major version
-            import platform
-            import subprocess
-            
             try:
                 chrome_version_output = subprocess.check_output([
                     "/Applications/Google Chrome.app/Contents/MacOS/Google Chrome", 
@@ -386,7 +575,6 @@ class SeleniumTwitterAgent:
             
             # Find ARM64 ChromeDriver - try multiple locations
             # Prioritize Homebrew as it handles code signing better
-            chromedriver_path = None
             home_dir = str(Path.home())
             possible_paths = [
                 "/opt/homebrew/bin/chromedriver",  # Homebrew ARM Mac (preferred - handles signing)
@@ -395,13 +583,11 @@ class SeleniumTwitterAgent:
                 "/usr/bin/chromedriver"            # System
             ]
             
-            for path in possible_paths:
-                if Path(path).exists():
-                    chromedriver_path = path
-                    logger.info(f"✅ Found ChromeDriver at: {chromedriver_path}")
-                    break
-            
-            if not chromedriver_path:
+            # Stat paths lazily in priority order and stop at the first real file
+            chromedriver_path = next((path for path in possible_paths if Path(path).is_file()), None)
+            if chromedriver_path:
+                logger.info(f"✅ Found ChromeDriver at: {chromedriver_path}")
+            else:
                 logger.warning("⚠️  ChromeDriver not found in standard locations, will auto-download")
             
             # Validate ChromeDriver version matches Chrome version
@@ -614,7 +800,7 @@ class SeleniumTwitterAgent:
         """Navigate to Twitter and check login status with improved session persistence"""
         try:
             logger.info("Navigating to X.com...")
-            self.driver.get("https://x.com/home")  # Go directly to /home instead of root
+            self.driver.get(TWITTER_HOME_URL)  # Go directly to /home instead of root
             
             # Wait longer for session restoration (Twitter needs time to check cookies)
             logger.info("⏳ Waiting for session to restore from cookies...")
@@ -704,9 +890,14 @@ class SeleniumTwitterAgent:
                 "url": self.driver.current_url
             }
             
-            with open(session_file, 'w') as f:
+            # Session data holds auth cookies - keep the file owner-only (0600).
+            # The open() mode only applies on creation, so also tighten files
+            # left world-readable by older versions
+            fd = os.open(session_file, os.O_CREAT | os.O_WRONLY | os.O_TRUNC, 0o600)
+            os.fchmod(fd, 0o600)
+            with os.fdopen(fd, 'w') as f:
                 json.dump(session_data, f, indent=2)
-            
+
             logger.debug(f"💾 Saved Twitter session data (cookies + local storage)")
             
         except Exception as e:
@@ -722,16 +913,19 @@ class SeleniumTwitterAgent:
                 logger.debug("No saved Twitter session found")
                 return False
             
-            with open(session_file, 'r') as f:
+            with open(session_file, 'rb') as f:
                 session_data = json.load(f)
             
+            # One clock read covers the age check and every cookie expiry below
+            now = time.time()
+            
             # Check if session is not too old (7 days)
-            age_days = (time.time() - session_data.get("timestamp", 0)) / 86400
+            age_days = (now - session_data.get("timestamp", 0)) / 86400
             if age_days > 7:
                 logger.debug(f"Saved session is {age_days:.1f} days old, may be expired")
             
             # First navigate to Twitter
-            self.driver.get("https://x.com")
+            self.driver.get(TWITTER_BASE_URL)
             time.sleep(2)
             
             # Restore cookies
@@ -739,7 +933,7 @@ class SeleniumTwitterAgent:
                 try:
                     # Remove expiry if it's in the past
                     if 'expiry' in cookie:
-                        if cookie['expiry'] < time.time():
+                        if cookie['expiry'] < now:
                             del cookie['expiry']
                     self.driver.add_cookie(cookie)
                 except Exception as cookie_err:
@@ -793,6 +987,7 @@ class SeleniumTwitterAgent:
                         if ':contains(' in selector:
                             # Extract the text to search for
                             text_to_find = selector.split(':contains("')[1].split('")')[0]
+                            text_to_find_lower = text_to_find.lower()
                             base_selector = selector.split(':contains(')[0]
 
                             # Find elements using the base selector
@@ -803,7 +998,7 @@ class SeleniumTwitterAgent:
                                 elements = self.driver.find_elements(By.XPATH, f"//*[contains(text(), '{text_to_find}')]")
 
                             for element in elements:
-                                if text_to_find.lower() in element.text.lower() and element.is_displayed():
+                                if text_to_find_lower in element.text.lower() and element.is_displayed():
                                     element.click()
                                     logger.info(f"✅ Successfully clicked Following tab using: {selector}")
                                     time.sleep(2)
@@ -841,6 +1036,64 @@ class SeleniumTwitterAgent:
             logger.error(f"Error selecting feed: {e}")
             return False
 
+    def _collect_tweet_articles(self) -> List[dict]:
+        """Read text and key links of every loaded tweet article in one WebDriver round-trip"""
+        # Walking each article from Python costs a round-trip per find_element/get_attribute;
+        # doing the same walk in the page returns plain data for all articles at once
+        return self.driver.execute_script("""
+            var selectors = arguments[0];
+            var profilePrefix = arguments[1];
+            return Array.from(document.querySelectorAll('[data-testid="tweet"]')).map(function(article) {
+                var text = '';
+                for (var i = 0; i < selectors.length; i++) {
+                    var el = article.querySelector(selectors[i]);
+                    if (el && el.innerText.trim()) {
+                        text = el.innerText.trim();
+                        break;
+                    }
+                }
+
+                var statusHref = null;
+                var profileHref = null;
+                var links = article.querySelectorAll('a');
+                for (var j = 0; j < links.length && !(statusHref && profileHref); j++) {
+                    var href = links[j].href || '';
+                    if (href.indexOf('/status/') !== -1) {
+                        if (!statusHref) statusHref = href;
+                    } else if (!profileHref && href.indexOf(profilePrefix) === 0 && href.split('/').length === 4) {
+                        profileHref = href;
+                    }
+                }
+
+                var authorLink = article.querySelector('[data-testid="User-Name"] a');
+
+                return {
+                    element: article,
+                    text: text,
+                    status_href: statusHref,
+                    profile_href: profileHref,
+                    author_href: authorLink ? authorLink.href : null
+                };
+            });
+        """, TWEET_TEXT_SELECTORS, TWITTER_BASE_URL + "/") or []
+
+    @staticmethod
+    def _parse_tweet_meta(article_data: dict, fallback_ids) -> tuple:
+        """Derive (tweet_id, username) from the links collected for a tweet article"""
+        status_href = article_data.get('status_href')
+        if status_href:
+            tweet_id = status_href.split("/status/")[-1].split("?")[0]
+        else:
+            # Only consume a run-local fallback id when there is no status link
+            tweet_id = f"tweet_{next(fallback_ids)}"
+
+        username = "unknown"
+        profile_href = article_data.get('profile_href')
+        if profile_href:
+            username = profile_href.split("/")[-1]
+
+        return tweet_id, username
+
     def extract_tweets_from_timeline(self) -> List[Dict[str, str]]:
         """Extract tweets from the timeline"""
         try:
@@ -863,84 +1116,41 @@ class SeleniumTwitterAgent:
 
                 # Find tweet articles
                 try:
-                    tweet_articles = self.driver.find_elements(By.CSS_SELECTOR, '[data-testid="tweet"]')
+                    tweet_articles = self._collect_tweet_articles()
                     logger.info(f"Found {len(tweet_articles)} tweet articles")
 
-                    for article in tweet_articles:
-                        try:
-                            # Extract tweet text with multiple selectors
-                            tweet_text_element = None
-                            tweet_text_selectors = [
-                                '[data-testid="tweetText"]',
-                                '[data-testid="tweet-text"]', 
-                                '.tweet-text',
-                                '[role="group"] div[lang]',
-                                'div[data-testid="tweet"] div[lang]',
-                                'article div[lang]'
-                            ]
-                            
-                            for selector in tweet_text_selectors:
-                                try:
-                                    tweet_text_element = article.find_element(By.CSS_SELECTOR, selector)
-                                    if tweet_text_element and tweet_text_element.text.strip():
-                                        break
-                                except:
-                                    continue
-                            
-                            if not tweet_text_element:
-                                logger.debug("Could not find tweet text element, skipping...")
-                                continue
-                                
-                            tweet_text = tweet_text_element.text.strip()
-
-                            # Skip if too short or already processed
-                            tweet_hash = self._get_tweet_hash(tweet_text)
-                            if len(tweet_text) < self.min_tweet_length or tweet_hash in self.processed_tweets:
-                                logger.debug(f"Skipping tweet: length={len(tweet_text)} (min {self.min_tweet_length} chars), already_processed={tweet_hash in self.processed_tweets}")
-                                continue
-
-                            # Try to extract tweet ID from links
-                            tweet_id = f"tweet_{len(tweets)}_{int(time.time())}"
-                            try:
-                                links = article.find_elements(By.TAG_NAME, "a")
-                                for link in links:
-                                    href = link.get_attribute("href") or ""
-                                    if "/status/" in href:
-                                        tweet_id = href.split("/status/")[-1].split("?")[0]
-                                        break
-                            except:
-                                pass
-
-                            # Extract username
-                            username = "unknown"
-                            try:
-                                user_links = article.find_elements(By.CSS_SELECTOR, 'a[href^="/"]')
-                                for link in user_links:
-                                    href = link.get_attribute("href") or ""
-                                    if href.count("/") == 3 and "/status/" not in href:  # Profile link
-                                        username = href.split("/")[-1]
-                                        break
-                            except:
-                                pass
-
-                            tweet_data = {
-                                'id': tweet_id,
-                                'content': tweet_text,
-                                'username': username,
-                                'element': article
-                            }
+                    for article_data in tweet_articles:
+                        tweet_text = article_data['text']
+                        if not tweet_text:
+                            logger.debug("Could not find tweet text element, skipping...")
+                            continue
+
+                        # Skip if too short (cheap length check first), then hash and skip if already processed
+                        if len(tweet_text) < self.min_tweet_length:
+                            logger.debug(f"Skipping tweet: too short ({len(tweet_text)} < {self.min_tweet_length} chars)")
+                            continue
+                        tweet_hash = self._get_tweet_hash(tweet_text)
+                        if tweet_hash in self.processed_tweets:
+                            logger.debug("Skipping tweet: already processed")
+                            continue
 
-                            tweets.append(tweet_data)
-                            self.processed_tweets.add(tweet_hash)
+                        tweet_id, username = self._parse_tweet_meta(article_data, self._fallback_tweet_ids)
 
-                            logger.info(f"Extracted tweet {len(tweets)}: {tweet_text[:100]}...")
+                        tweet_data = {
+                            'id': tweet_id,
+                            'content': tweet_text,
+                            'username': username,
+                            'element': article_data['element']
+                        }
 
-                            if len(tweets) >= self.max_tweets_per_session:
-                                break
+                        tweets.append(tweet_data)
+                        self.processed_tweets[tweet_hash] = time.time()
+                        self._processed_tweets_dirty = True
 
-                        except Exception as e:
-                            logger.warning(f"Error extracting individual tweet: {e}")
-                            continue
+                        logger.info(f"Extracted tweet {len(tweets)}: {tweet_text[:100]}...")
+
+                        if len(tweets) >= self.max_tweets_per_session:
+                            break
 
                 except Exception as e:
                     logger.warning(f"Error finding tweet articles: {e}")
@@ -976,100 +1186,50 @@ class SeleniumTwitterAgent:
             time.sleep(2)
 
             # Find tweet articles
-            tweet_articles = self.driver.find_elements(By.CSS_SELECTOR, '[data-testid="tweet"]')
+            tweet_articles = self._collect_tweet_articles()
             logger.info(f"Found {len(tweet_articles)} tweet articles")
 
-            for article in tweet_articles:
-                try:
-                    # Extract tweet text with multiple selectors
-                    tweet_text_element = None
-                    tweet_text_selectors = [
-                        '[data-testid="tweetText"]',
-                        '[data-testid="tweet-text"]', 
-                        '.tweet-text',
-                        '[role="group"] div[lang]',
-                        'div[data-testid="tweet"] div[lang]',
-                        'article div[lang]'
-                    ]
-                    
-                    for selector in tweet_text_selectors:
-                        try:
-                            tweet_text_element = article.find_element(By.CSS_SELECTOR, selector)
-                            if tweet_text_element and tweet_text_element.text.strip():
-                                break
-                        except:
-                            continue
-                    
-                    if not tweet_text_element:
-                        logger.debug("Could not find tweet text element, skipping...")
-                        continue
-                        
-                    tweet_text = tweet_text_element.text.strip()
-
-                    # Skip if too short or already processed
-                    tweet_hash = self._get_tweet_hash(tweet_text)
-                    if len(tweet_text) < self.min_tweet_length or tweet_hash in self.processed_tweets:
-                        logger.debug(f"Skipping tweet: length={len(tweet_text)} (min {self.min_tweet_length} chars), already_processed={tweet_hash in self.processed_tweets}")
-                        continue
+            for article_data in tweet_articles:
+                article = article_data['element']
+                tweet_text = article_data['text']
+                if not tweet_text:
+                    logger.debug("Could not find tweet text element, skipping...")
+                    continue
 
-                    # Check if this is our own tweet/reply - skip it
-                    try:
-                        # Look for username in the tweet
-                        username_element = article.find_element(By.CSS_SELECTOR, '[data-testid="User-Name"] a')
-                        username = username_element.get_attribute('href')
-                        if username:
-                            # Extract username from URL like https://x.com/username
-                            username = username.split('/')[-1].lower()
-                            
-                            # Skip if this is our own tweet (we don't want to reply to ourselves)
-                            if self.current_username and username == self.current_username:
-                                logger.info(f"🚫 Skipping our own tweet from @{username}")
-                                continue
-                                
-                    except Exception as e:
-                        logger.debug(f"Could not extract username: {e}")
-                        # If we can't determine the username, continue processing
-                        pass
+                # Skip if too short (cheap length check first), then hash and skip if already processed
+                if len(tweet_text) < self.min_tweet_length:
+                    logger.debug(f"Skipping tweet: too short ({len(tweet_text)} < {self.min_tweet_length} chars)")
+                    continue
+                tweet_hash = self._get_tweet_hash(tweet_text)
+                if tweet_hash in self.processed_tweets:
+                    logger.debug("Skipping tweet: already processed")
+                    continue
 
-                    # Try to extract tweet ID from links
-                    tweet_id = f"tweet_{int(time.time())}"
-                    try:
-                        links = article.find_elements(By.TAG_NAME, "a")
-                        for link in links:
-                            href = link.get_attribute("href") or ""
-                            if "/status/" in href:
-                                tweet_id = href.split("/status/")[-1].split("?")[0]
-                                break
-                    except:
-                        pass
+                # Check if this is our own tweet/reply - skip it
+                author_href = article_data['author_href']
+                if author_href and self.current_username:
+                    # Extract username from URL like https://x.com/username
+                    author = author_href.split('/')[-1].lower()
 
-                    # Extract username
-                    username = "unknown"
-                    try:
-                        user_links = article.find_elements(By.CSS_SELECTOR, 'a[href^="/"]')
-                        for link in user_links:
-                            href = link.get_attribute("href") or ""
-                            if href.count("/") == 3 and "/status/" not in href:  # Profile link
-                                username = href.split("/")[-1]
-                                break
-                    except:
-                        pass
+                    # Skip if this is our own tweet (we don't want to reply to ourselves)
+                    if author == self.current_username:
+                        logger.info(f"🚫 Skipping our own tweet from @{author}")
+                        continue
 
-                    tweet_data = {
-                        'id': tweet_id,
-                        'content': tweet_text,
-                        'username': username,
-                        'element': article
-                    }
+                tweet_id, username = self._parse_tweet_meta(article_data, self._fallback_tweet_ids)
 
-                    # Mark as processed
-                    self.processed_tweets.add(tweet_hash)
-                    logger.info(f"Found unprocessed tweet: {tweet_text[:100]}...")
-                    return tweet_data
+                tweet_data = {
+                    'id': tweet_id,
+                    'content': tweet_text,
+                    'username': username,
+                    'element': article
+                }
 
-                except Exception as e:
-                    logger.warning(f"Error extracting individual tweet: {e}")
-                    continue
+                # Mark as processed
+                self.processed_tweets[tweet_hash] = time.time()
+                self._processed_tweets_dirty = True
+                logger.info(f"Found unprocessed tweet: {tweet_text[:100]}...")
+                return tweet_data
 
             logger.info("No unprocessed tweets found")
             return None
@@ -1109,9 +1269,9 @@ class SeleniumTwitterAgent:
 
             for handle in self.driver.window_handles:
                 self.driver.switch_to.window(handle)
-                current_url = self.driver.current_url
+                current_url = self.driver.current_url.lower()
                 # Check for any AI service URL
-                if any(service in current_url.lower() for service in ['perplexity.ai', 'chatgpt.com', 'chat.openai.com', 'gemini.google.com']):
+                if any(domain in current_url for domain in AI_SERVICE_DOMAINS):
                     ai_service_handle = handle
                     logger.info(f"✅ Found and preserved {self.ai_service.upper()} tab")
                 elif "x.com" in current_url or "twitter.com" in current_url:
@@ -1135,7 +1295,7 @@ class SeleniumTwitterAgent:
 
             # Open new Twitter tab with fresh state
             logger.info("🆕 Opening fresh Twitter tab...")
-            self.driver.execute_script("window.open('https://x.com/home', '_blank');")
+            self.driver.execute_script("window.open(arguments[0], '_blank');", TWITTER_HOME_URL)
             time.sleep(3)
 
             # Switch to the new Twitter tab
@@ -1314,19 +1474,9 @@ class SeleniumTwitterAgent:
                 logger.warning(f"Could not click tweet: {e}, trying direct reply approach...")
             
             # Step 2: Find and click reply button (should be more accessible now)
-            reply_selectors = [
-                '[data-testid="reply"]',
-                '[aria-label*="Reply"]',
-                '[aria-label*="reply"]',
-                'button[data-testid="reply"]',
-                '[role="button"][aria-label*="Reply"]',
-                '[role="button"][aria-label*="reply"]',
-                'button[aria-label*="Reply"]',
-                'button[aria-label*="reply"]'
-            ]
             
             reply_button = None
-            for selector in reply_selectors:
+            for selector in REPLY_BUTTON_SELECTORS:
                 try:
                     reply_button = self.driver.find_element(By.CSS_SELECTOR, selector)
                     if reply_button.is_displayed() and reply_button.is_enabled():
@@ -1358,16 +1508,9 @@ class SeleniumTwitterAgent:
             
             # Step 4: Verify reply interface is open
             time.sleep(2)
-            compose_selectors = [
-                '[data-testid="tweetTextarea_0"]',
-                '[data-testid="tweetTextarea"]',
-                'div[contenteditable="true"]',
-                'textarea[placeholder*="reply"]',
-                'textarea[placeholder*="Reply"]'
-            ]
             
             compose_found = False
-            for selector in compose_selectors:
+            for selector in COMPOSE_SELECTORS:
                 try:
                     compose_element = self.driver.find_element(By.CSS_SELECTOR, selector)
                     if compose_element.is_displayed():
@@ -1394,16 +1537,9 @@ class SeleniumTwitterAgent:
             logger.info("Pasting response to reply interface...")
             
             # Find the compose area (should already be open)
-            compose_selectors = [
-                '[data-testid="tweetTextarea_0"]',
-                '[data-testid="tweetTextarea"]',
-                'div[contenteditable="true"]',
-                'textarea[placeholder*="reply"]',
-                'textarea[placeholder*="Reply"]'
-            ]
             
             compose_element = None
-            for selector in compose_selectors:
+            for selector in COMPOSE_SELECTORS:
                 try:
                     compose_element = self.driver.find_element(By.CSS_SELECTOR, selector)
                     if compose_element.is_displayed():
@@ -1568,16 +1704,9 @@ class SeleniumTwitterAgent:
                 return False
             
             # Find and click the post/reply button
-            post_selectors = [
-                '[data-testid="tweetButton"]',
-                '[data-testid="tweetButtonInline"]',
-                'button[data-testid="tweetButton"]',
-                'button[data-testid="tweetButtonInline"]',
-                '[role="button"][data-testid="tweetButton"]'
-            ]
             
             post_button = None
-            for selector in post_selectors:
+            for selector in POST_BUTTON_SELECTORS:
                 try:
                     post_button = self.driver.find_element(By.CSS_SELECTOR, selector)
                     if post_button.is_displayed():
@@ -1639,13 +1768,12 @@ class SeleniumTwitterAgent:
                 
                 # Check for success indicators
                 try:
-                    page_text = self.driver.find_element(By.TAG_NAME, "body").text.lower()
-                    success_indicators = ["your reply was sent", "reply sent", "posted"]
-                    
-                    for indicator in success_indicators:
-                        if indicator in page_text:
-                            logger.info(f"✅ Success indicator found: '{indicator}'")
-                            return True
+                    # One case-insensitive scan of the body text, no lowercased copy of the page
+                    page_text = self.driver.find_element(By.TAG_NAME, "body").text
+                    match = REPLY_SUCCESS_PATTERN.search(page_text)
+                    if match:
+                        logger.info(f"✅ Success indicator found: '{match.group(0).lower()}'")
+                        return True
                     
                     # Also check if we're back to timeline (indicates success)
                     current_url = self.driver.current_url
@@ -1714,6 +1842,7 @@ class SeleniumTwitterAgent:
             processed_count = 0
             tweet_num = 0
             no_tweets_count = 0
+            consecutive_ai_failures = 0
             
             logger.info("🔄 Starting infinite tweet processing loop...")
             
@@ -1722,6 +1851,12 @@ class SeleniumTwitterAgent:
                 logger.info(f"\n--- Looking for tweet {tweet_num} (processed: {processed_count}) ---")
                 logger.info(f"📊 Current {self.ai_service.upper()} chat: {self.ai_service_instance.current_chat_response_count}/{self.ai_responses_per_chat} responses used")
 
+                # Wait for a free reply slot before picking a tweet, so we never sit on an
+                # extracted (and already marked) tweet while the hourly window drains
+                self._wait_for_reply_slot()
+                if self.max_replies_per_hour > 0:
+                    logger.info(f"🚦 Hourly replies: {len(self.reply_timestamps)}/{self.max_replies_per_hour} used")
+
                 # Extract a single tweet
                 tweet = self.extract_single_tweet()
                 if not tweet:
@@ -1761,6 +1896,12 @@ class SeleniumTwitterAgent:
                 
                 logger.info(f"Tweet content: {tweet['content'][:100]}...")
                 
+                # Pre-flight: a tweet that is only links/mentions gives the AI nothing to
+                # riff on, so skip it before spending a query (and retries) on it
+                if self._is_mostly_links_or_mentions(tweet['content']):
+                    logger.info(f"⏭️ Skipping tweet {tweet_num}: mostly links/mentions")
+                    continue
+                
                 # IMPROVED WORKFLOW: Use existing AI chat session
                 logger.info(f"Switching to {self.ai_service.upper()} tab for chat...")
                 if not self.ai_service_instance.switch_to_tab():
@@ -1768,11 +1909,12 @@ class SeleniumTwitterAgent:
                     continue
                 
                 # Format prompt with base_prompt template
-                prompt = self.base_prompt.format(tweet_content=tweet['content'])
+                prompt = self._format_prompt(tweet['content'])
                 
                 # Try to get a valid response with retry logic
                 response = None
                 retry_count = 0
+                last_rejected_response = None
                 
                 while retry_count < self.max_ai_retries:
                     if retry_count > 0:
@@ -1782,11 +1924,15 @@ class SeleniumTwitterAgent:
                     raw_response = self.ai_service_instance.query(prompt)
                     
                     # Check if response is valid (not an error message)
-                    if raw_response and not self._is_error_response(raw_response):
+                    if raw_response and raw_response == last_rejected_response:
+                        # Same text we already rejected - no need to validate it again
+                        logger.warning(f"❌ Response identical to the rejected one, retrying... (attempt {retry_count + 1}/{self.max_ai_retries})")
+                    elif raw_response and not self._is_error_response(raw_response):
                         response = raw_response
                         logger.info(f"✅ Got valid response from {self.ai_service.upper()}")
                         break
                     elif raw_response:
+                        last_rejected_response = raw_response
                         logger.warning(f"❌ Response contains error message, retrying... (attempt {retry_count + 1}/{self.max_ai_retries})")
                         logger.debug(f"Error response preview: {raw_response[:100]}...")
                     else:
@@ -1815,8 +1961,27 @@ class SeleniumTwitterAgent:
                 # Check if we got a valid response after all retries
                 if not response:
                     logger.error(f"✗ Failed to get valid response after {self.max_ai_retries} attempts for tweet {tweet_num}")
+                    consecutive_ai_failures += 1
+
+                    # Circuit breaker: stop hammering an AI service that keeps failing
+                    # (rate limits, outages) and give it time to recover instead
+                    if self.ai_failure_threshold > 0 and consecutive_ai_failures >= self.ai_failure_threshold:
+                        logger.warning(f"🔌 {consecutive_ai_failures} tweets in a row failed on {self.ai_service.upper()} - pausing {self.ai_cooldown_seconds}s before trying again")
+                        time.sleep(self.ai_cooldown_seconds)
+                        consecutive_ai_failures = 0
+                        try:
+                            if self.ai_service_instance.refresh():
+                                logger.info(f"✅ {self.ai_service.upper()} refreshed after cooldown")
+                        except Exception as e:
+                            logger.warning(f"Could not refresh {self.ai_service.upper()} after cooldown: {e}")
                     continue
-                
+
+                consecutive_ai_failures = 0
+
+                # Optionally trim before typing (opt-in via MAX_RESPONSE_LENGTH). Counts plain
+                # characters, not x.com's weighted length, so it is only an approximate cap
+                response = self._truncate_response(response)
+
                 # Switch back to Twitter tab
                 logger.info("Switching back to Twitter tab...")
                 if not self.switch_to_twitter_tab():
@@ -1832,6 +1997,7 @@ class SeleniumTwitterAgent:
                 if self.reply_to_tweet(tweet, response):
                     logger.info(f"✓ Successfully replied to tweet {tweet_num}")
                     processed_count += 1
+                    self.reply_timestamps.append(time.monotonic())
                     
                     # Go back to Twitter home with completely fresh tab
                     logger.info("🏠 Going back to Twitter home with fresh tab...")
@@ -1843,7 +2009,7 @@ class SeleniumTwitterAgent:
                             logger.warning("Could not refresh Twitter with fresh tab, trying fallback...")
                             # Fallback to regular navigation if fresh tab fails
                             if self.switch_to_twitter_tab():
-                                self.driver.get("https://x.com/home")
+                                self.driver.get(TWITTER_HOME_URL)
                                 time.sleep(5)
                                 self.driver.execute_script("window.scrollTo(0, 0);")
                                 time.sleep(2)
@@ -1862,11 +2028,6 @@ class SeleniumTwitterAgent:
                 if processed_count % self.save_frequency == 0:
                     logger.info("💾 Saving processed tweets...")
                     self._save_processed_tweets()
-                
-                # Wait between tweets
-                wait_time = 0
-                logger.info(f"Waiting {wait_time} seconds before next tweet...")
-                time.sleep(wait_time)
             
         except KeyboardInterrupt:
             logger.info("\n🛑 Process interrupted by user")